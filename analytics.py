@@ -0,0 +1,99 @@
+import numpy as np
+from numba import njit
+
+# ------------------------------
+# ROLLING PAIR STATISTICS (single-pass kernel)
+# ------------------------------
+# Kept outside dashboard.py so Streamlit reruns don't re-JIT it;
+# cache=True also persists the compiled code between app restarts.
+@njit(cache=True)
+def compute_stats(a, b, w):
+    """Rolling spread/mean/std/zscore/correlation of two price series in one pass.
+
+    Matches the pandas chain it replaces: spread = a - b, rolling mean over
+    at most ``w`` points (min 1), sample std (ddof=1, zero -> NaN), z-score,
+    and rolling Pearson correlation of a and b (min 2 points).
+    Uses sliding-window Welford updates. Removing points leaves rounding
+    residue in the sums, so flat windows (e.g. forward-filled gaps) are detected
+    from run lengths of repeated values instead: they report NaN std/z-score/
+    correlation and reset their accumulators to exact values, which also clears
+    the residue for the windows that follow.
+    """
+    n = a.shape[0]
+    spread = np.empty(n)
+    mean = np.empty(n)
+    std = np.empty(n)
+    zscore = np.empty(n)
+    corr = np.empty(n)
+
+    k = 0
+    m_d = 0.0
+    m2_d = 0.0
+    m_a = 0.0
+    m_b = 0.0
+    m2_a = 0.0
+    m2_b = 0.0
+    c_ab = 0.0
+    run_d = 0  # length of the current run of identical values
+    run_a = 0
+    run_b = 0
+    for i in range(n):
+        # add the newest point
+        k += 1
+        d = a[i] - b[i]
+        delta = d - m_d
+        m_d += delta / k
+        m2_d += delta * (d - m_d)
+        da = a[i] - m_a
+        m_a += da / k
+        db = b[i] - m_b
+        m_b += db / k
+        m2_a += da * (a[i] - m_a)
+        m2_b += db * (b[i] - m_b)
+        c_ab += da * (b[i] - m_b)
+
+        # drop the point leaving the window
+        if i >= w:
+            j = i - w
+            k -= 1
+            d_old = a[j] - b[j]
+            delta = d_old - m_d
+            m_d -= delta / k
+            m2_d -= delta * (d_old - m_d)
+            da = a[j] - m_a
+            m_a -= da / k
+            db = b[j] - m_b
+            m_b -= db / k
+            m2_a -= da * (a[j] - m_a)
+            m2_b -= db * (b[j] - m_b)
+            c_ab -= da * (b[j] - m_b)
+
+        run_d = run_d + 1 if i > 0 and d == a[i - 1] - b[i - 1] else 1
+        run_a = run_a + 1 if i > 0 and a[i] == a[i - 1] else 1
+        run_b = run_b + 1 if i > 0 and b[i] == b[i - 1] else 1
+        if run_d >= k:
+            m_d = d
+            m2_d = 0.0
+        if run_a >= k:
+            m_a = a[i]
+            m2_a = 0.0
+            c_ab = 0.0
+        if run_b >= k:
+            m_b = b[i]
+            m2_b = 0.0
+            c_ab = 0.0
+
+        spread[i] = d
+        mean[i] = m_d
+        if k >= 2 and m2_d > 0.0:
+            std[i] = np.sqrt(m2_d / (k - 1))
+            zscore[i] = (d - m_d) / std[i]
+        else:
+            std[i] = np.nan
+            zscore[i] = np.nan
+        if k >= 2 and m2_a > 0.0 and m2_b > 0.0:
+            corr[i] = min(1.0, max(-1.0, c_ab / np.sqrt(m2_a * m2_b)))
+        else:
+            corr[i] = np.nan
+
+    return spread, mean, std, zscore, corr
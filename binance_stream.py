@@ -1,54 +1,199 @@
 import asyncio
+import logging
+import logging.handlers
+import queue
 import websockets
-import json
+import orjson
 import sqlite3
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import uvloop  # faster libuv-based event loop; not available on Windows
+except ImportError:
+    uvloop = None
+
+DB_PATH = "tick_data.db"
+SYMBOLS = ("BTCUSDT", "ETHUSDT")
+BATCH_SIZE = 500        # max ticks written per transaction
+FLUSH_INTERVAL = 0.2    # writer sleep when the queue has been drained
+QUEUE_SIZE = 4096       # parsed ticks waiting for the writer; oldest dropped when full
+
+LOG_LEVEL = logging.INFO  # set to DEBUG to log every tick
+LOG_EVERY = 500           # ticks between INFO progress lines
+
+log = logging.getLogger("binance_stream")
+
+# one upsert per symbol column of wide_ticks (last price per 1-second bucket)
+_WIDE_UPSERTS = {
+    s: f"INSERT INTO wide_ticks (ts, {s}) VALUES (?, ?) ON CONFLICT(ts) DO UPDATE SET {s} = excluded.{s}"
+    for s in SYMBOLS
+}
+
+# ------------------------------
+# LOGGING (formatted and written off the event loop)
+# ------------------------------
+def setup_logging():
+    """Route records through a queue to a background listener thread so stdout
+    writes never block the websocket loop. Returns the started listener."""
+    log_queue = queue.SimpleQueue()
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    return listener
 
 # ------------------------------
 # DATABASE SETUP
 # ------------------------------
+def apply_pragmas(conn):
+    """Tune a connection for fast ingest. journal_mode=WAL persists in the file;
+    the other settings are per-connection and must be applied on every connect."""
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")
+    conn.execute("PRAGMA cache_size=-65536;")
+
 def init_db():
-    conn = sqlite3.connect("tick_data.db")
+    conn = sqlite3.connect(DB_PATH)
+    apply_pragmas(conn)
     c = conn.cursor()
     c.execute("""CREATE TABLE IF NOT EXISTS ticks (
                     symbol TEXT,
-                    timestamp DATETIME,
+                    timestamp INTEGER,
                     price REAL,
                     qty REAL
                 )""")
+    # pre-pivoted 1-second last prices, one column per symbol, so the dashboard
+    # can skip the groupby/resample/unstack on raw ticks
+    columns = ", ".join(f"{s} REAL" for s in SYMBOLS)
+    c.execute(f"CREATE TABLE IF NOT EXISTS wide_ticks (ts INTEGER PRIMARY KEY, {columns})")
+    # one-off migration: older collectors stored timestamps as ISO text
+    c.execute("""UPDATE ticks
+                 SET timestamp = CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)
+                 WHERE typeof(timestamp) = 'text' AND julianday(timestamp) IS NOT NULL""")
     conn.commit()
     conn.close()
 
 # ------------------------------
-# INSERT FUNCTION
+# BATCH FLUSH
 # ------------------------------
-def insert_tick(symbol, timestamp, price, qty):
-    conn = sqlite3.connect("tick_data.db")
-    c = conn.cursor()
-    c.execute("INSERT INTO ticks VALUES (?, ?, ?, ?)", (symbol, timestamp, price, qty))
-    conn.commit()
-    conn.close()
+def wide_rows(batch):
+    """Last price per (symbol, 1-second bucket) in the batch, grouped by symbol."""
+    last = {s: {} for s in SYMBOLS}
+    for symbol, ts, price, _ in batch:
+        if symbol in last:
+            last[symbol][ts // 1000] = price
+    return {s: list(rows.items()) for s, rows in last.items() if rows}
+
+def write_batch(conn, batch):
+    """Write a batch of ticks (and their wide_ticks upserts) in a single transaction."""
+    if not batch:
+        return
+    conn.execute("BEGIN")
+    try:
+        conn.executemany("INSERT INTO ticks VALUES (?, ?, ?, ?)", batch)
+        for symbol, rows in wide_rows(batch).items():
+            conn.executemany(_WIDE_UPSERTS[symbol], rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def drain(ticks, limit):
+    """Take up to ``limit`` ticks from the queue without waiting."""
+    batch = []
+    while len(batch) < limit and not ticks.empty():
+        batch.append(ticks.get_nowait())
+    return batch
+
+# ------------------------------
+# PRODUCER: websocket -> queue
+# ------------------------------
+async def receive_ticks(websocket, ticks):
+    """Parse trade messages into tick tuples and enqueue them; never touches the DB."""
+    n_ticks = 0
+    n_dropped = 0
+    async for msg in websocket:
+        payload = orjson.loads(msg).get("data", {})
+        symbol = payload.get("s")
+        price = float(payload.get("p", 0))
+        qty = float(payload.get("q", 0))
+        ts = int(payload.get("T", 0))  # epoch milliseconds
+        tick = (symbol, ts, price, qty)
+        try:
+            ticks.put_nowait(tick)
+        except asyncio.QueueFull:
+            # writer is behind: drop the oldest tick rather than stall recv
+            ticks.get_nowait()
+            ticks.put_nowait(tick)
+            n_dropped += 1
+        log.debug("[%s] %s @ %s", symbol, price, ts)
+        n_ticks += 1
+        if n_ticks % LOG_EVERY == 0:
+            log.info("%d ticks received (%d dropped), last [%s] %s @ %s", n_ticks, n_dropped, symbol, price, ts)
+
+# ------------------------------
+# CONSUMER: queue -> SQLite (in a worker thread)
+# ------------------------------
+async def write_ticks(conn, ticks, executor):
+    """Drain the queue in batches and write them on the single DB thread."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = drain(ticks, BATCH_SIZE)
+        if batch:
+            await loop.run_in_executor(executor, write_batch, conn, batch)
+        if len(batch) < BATCH_SIZE:
+            await asyncio.sleep(FLUSH_INTERVAL)
 
 # ------------------------------
 # BINANCE STREAM HANDLER
 # ------------------------------
 async def binance_websocket_handler():
-    uri = "wss://stream.binance.com:9443/stream?streams=btcusdt@trade/ethusdt@trade"
+    streams = "/".join(f"{s.lower()}@trade" for s in SYMBOLS)
+    uri = f"wss://stream.binance.com:9443/stream?streams={streams}"
     print(f"Connecting to {uri}")
-    async with websockets.connect(uri) as websocket:
-        print("✅ Connected to Binance combined stream\n")
-        while True:
-            msg = await websocket.recv()
-            data = json.loads(msg)
-            stream = data.get("stream", "")
-            payload = data.get("data", {})
-            symbol = payload.get("s")
-            price = float(payload.get("p", 0))
-            qty = float(payload.get("q", 0))
-            ts = datetime.utcfromtimestamp(payload.get("T", 0)/1000.0)
-            insert_tick(symbol, ts, price, qty)
-            print(f"[{symbol}] {price} @ {ts}")
+    # one long-lived connection shared by the writer thread; transactions are explicit
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+    apply_pragmas(conn)
+    ticks = asyncio.Queue(maxsize=QUEUE_SIZE)
+    # one worker so DB writes stay serialized on the shared connection
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        # no compression, unbounded receive queue and 1 MiB frame/buffer limits so
+        # bursts are absorbed by the client instead of stalling the read loop
+        async with websockets.connect(
+            uri, compression=None, max_size=2**20, max_queue=None, write_limit=2**20
+        ) as websocket:
+            print("✅ Connected to Binance combined stream\n")
+            tasks = [
+                asyncio.create_task(receive_ticks(websocket, ticks)),
+                asyncio.create_task(write_ticks(conn, ticks, executor)),
+            ]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()  # re-raise a failure from either side
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        # a cancelled writer may still have a batch in flight on the worker thread
+        executor.shutdown(wait=True)
+        write_batch(conn, drain(ticks, ticks.qsize()))
+        conn.close()
 
 if __name__ == "__main__":
     init_db()
-    asyncio.get_event_loop().run_until_complete(binance_websocket_handler())
+    listener = setup_logging()
+    try:
+        if uvloop is not None:
+            # per-run loop factory instead of a global event-loop policy
+            with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                runner.run(binance_websocket_handler())
+        else:
+            asyncio.run(binance_websocket_handler())
+    finally:
+        listener.stop()
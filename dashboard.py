@@ -1,12 +1,12 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 from statsmodels.tsa.stattools import adfuller
-import plotly.express as px
+import plotly.graph_objects as go
+import pyarrow.json as paj
 import sqlite3
 import os
-from streamlit_autorefresh import st_autorefresh
+from analytics import compute_stats
 
 # -----------------------------
 # Page Configuration
@@ -27,47 +27,113 @@ rolling_window = st.sidebar.number_input("Rolling window (periods)", 3, 200, 20)
 z_alert = st.sidebar.slider("Z-score alert threshold", 0.5, 5.0, 2.0, 0.1)
 refresh_rate = st.sidebar.slider("Auto-refresh interval (seconds)", 2, 30, 5)
 
-# -----------------------------
-# Auto Refresh Setup (DB mode uses autorefresh)
-# -----------------------------
-if mode == "🗄️ Live Database":
-    _ = st_autorefresh(interval=refresh_rate * 1000, key="live_refresh")
-
 # -----------------------------
 # Cached file reader (safe)
 # -----------------------------
 @st.cache_data(ttl=10)
 def read_ndjson(file_path: str) -> pd.DataFrame:
     """Read NDJSON file and normalize types. Cached safely (no widgets here)."""
-    df = pd.read_json(file_path, lines=True)
-    # permissive parsing for timestamps
-    df["ts"] = pd.to_datetime(df["ts"], errors="coerce", infer_datetime_format=True)
+    # Arrow's multithreaded JSON reader parses in 1 MiB blocks across cores
+    table = paj.read_json(file_path, read_options=paj.ReadOptions(use_threads=True, block_size=1 << 20))
+    df = table.to_pandas()
+    # epoch-ms integers convert vectorized; ISO-8601 strings (browser exports) are parsed
+    if pd.api.types.is_numeric_dtype(df["ts"]):
+        df["ts"] = pd.to_datetime(df["ts"], unit="ms", utc=True, errors="coerce")
+    else:
+        df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
     df["price"] = pd.to_numeric(df["price"], errors="coerce")
     df = df.dropna(subset=["ts", "price"])
+    df["symbol"] = df["symbol"].astype("category")
+    # files written in arrival order are usually time-ordered; only sort when not
+    if df["ts"].is_monotonic_increasing:
+        return df
     return df.sort_values("ts")
 
 # -----------------------------
-# DB loader (not cached — small query each refresh)
+# Shared read-only DB connection (reused across refreshes)
 # -----------------------------
+@st.cache_resource
+def get_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect("tick_data.db", check_same_thread=False)
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+# -----------------------------
+# DB loader (incremental — only rows newer than the last seen rowid)
+# -----------------------------
+DB_TAIL_ROWS = 5000  # number of most recent ticks kept for analytics
+
 def load_from_db() -> pd.DataFrame:
-    conn = sqlite3.connect("tick_data.db")
-    query = "SELECT symbol, timestamp AS ts, price FROM ticks ORDER BY timestamp DESC LIMIT 5000"
+    conn = get_conn()
+    last_rowid = st.session_state.get("last_rowid")
+    cached = st.session_state.get("df_cache", pd.DataFrame())
+    if last_rowid is not None:
+        # a recreated or emptied table restarts rowids below the cursor: reload from scratch
+        try:
+            max_rowid = conn.execute("SELECT max(rowid) FROM ticks").fetchone()[0]
+        except Exception as e:
+            st.error("Error reading DB: " + str(e))
+            return cached
+        if max_rowid is None or max_rowid < last_rowid:
+            last_rowid = None
+            cached = pd.DataFrame()
+            st.session_state.pop("last_rowid", None)
+            st.session_state.pop("df_cache", None)
+    # rows written before timestamps were stored as epoch-ms integers are skipped
+    if last_rowid is None:
+        query = ("SELECT rowid, symbol, timestamp AS ts, price FROM ticks "
+                 "WHERE typeof(timestamp) = 'integer' ORDER BY rowid DESC LIMIT ?")
+        params = (DB_TAIL_ROWS,)
+    else:
+        query = ("SELECT rowid, symbol, timestamp AS ts, price FROM ticks "
+                 "WHERE rowid > ? AND typeof(timestamp) = 'integer' ORDER BY rowid")
+        params = (last_rowid,)
     try:
-        df = pd.read_sql_query(query, conn)
+        new_rows = pd.read_sql_query(query, conn, params=params)
     except Exception as e:
-        conn.close()
         st.error("Error reading DB: " + str(e))
+        return cached
+    if new_rows.empty:
+        return cached
+
+    st.session_state["last_rowid"] = int(new_rows["rowid"].max())
+    if last_rowid is None:
+        new_rows = new_rows.iloc[::-1]  # initial tail was read newest-first
+    new_rows = new_rows.drop(columns="rowid")
+    new_rows["ts"] = pd.to_datetime(new_rows["ts"], unit="ms", utc=True)
+    new_rows = new_rows.dropna(subset=["ts", "price", "symbol"])
+
+    df = pd.concat([cached, new_rows], ignore_index=True) if not cached.empty else new_rows
+    # rowid order is insertion order, which the collector keeps monotonic in ts
+    df = df.tail(DB_TAIL_ROWS).reset_index(drop=True)
+    # re-encode after concat (differing categories fall back to object dtype)
+    df["symbol"] = df["symbol"].astype("category")
+    st.session_state["df_cache"] = df
+    return df
+
+# -----------------------------
+# Wide loader (1-second last prices pre-pivoted by the collector)
+# -----------------------------
+WIDE_TAIL_ROWS = 2000  # most recent 1-second buckets
+
+def load_wide_from_db() -> pd.DataFrame:
+    """Return wide_ticks indexed by ts, one column per symbol; empty if unavailable."""
+    query = "SELECT * FROM wide_ticks ORDER BY ts DESC LIMIT ?"
+    try:
+        wide = pd.read_sql_query(query, get_conn(), params=(WIDE_TAIL_ROWS,))
+    except Exception:
+        # older databases have no wide_ticks table; the caller falls back to raw ticks
         return pd.DataFrame()
-    conn.close()
-    if df.empty:
-        return pd.DataFrame()
-    df["ts"] = pd.to_datetime(df["ts"], errors="coerce", infer_datetime_format=True)
-    df = df.dropna(subset=["ts", "price", "symbol"])
-    return df.sort_values("ts")
+    if wide.empty:
+        return wide
+    wide["ts"] = pd.to_datetime(wide["ts"], unit="s", utc=True)
+    return wide.set_index("ts").iloc[::-1]
 
 # -----------------------------
-# Fetch Data: NDJSON or DB
+# Fetch Data: NDJSON (static, read once per rerun of the full script)
 # -----------------------------
+selected_file = None
+ndjson_df = None
 if mode == "📁 NDJSON File":
     # list files and select (widget outside cached function)
     ndjson_files = [f for f in os.listdir() if f.endswith(".ndjson")]
@@ -77,155 +143,216 @@ if mode == "📁 NDJSON File":
     selected_file = st.sidebar.selectbox("Select NDJSON file", ndjson_files)
     # read using cached reader
     try:
-        df = read_ndjson(selected_file)
+        ndjson_df = read_ndjson(selected_file)
     except Exception as e:
         st.error("Error reading selected NDJSON: " + str(e))
         st.stop()
+    st.sidebar.success(f"✅ Loaded {len(ndjson_df)} rows")
+    if ndjson_df.empty:
+        st.stop()
 else:
     st.sidebar.info("🔄 Live data auto-refresh every few seconds")
-    df = load_from_db()
-    if df.empty:
-        st.sidebar.warning("⚠️ Database empty or no ticks yet. Start collector or switch to NDJSON.")
-        st.stop()
-
-st.sidebar.success(f"✅ Loaded {len(df)} rows")
-if df.empty:
-    st.stop()
 
 # -----------------------------
-# Symbol Selection
+# ADF p-value (cached longer than the analytics refresh)
 # -----------------------------
-symbols = df["symbol"].unique().tolist()
-if len(symbols) < 2:
-    st.warning("⚠️ Not enough symbols in data. Waiting for more...")
-    st.stop()
-
-col1, col2 = st.columns(2)
-s1 = col1.selectbox("Symbol 1", symbols, index=0)
-s2 = col2.selectbox("Symbol 2", symbols, index=1 if len(symbols) > 1 else 0)
-
-if s1 == s2:
-    st.warning("Please select two different symbols.")
-    st.stop()
+@st.cache_data(ttl=30, max_entries=4)
+def cached_adf(_spread: np.ndarray, signature: tuple) -> float:
+    """ADF p-value of the spread. Keyed on ``signature`` (pair, timeframe, first/last
+    timestamp, length) rather than the values, so updates to the last bar within
+    the 30 s TTL reuse the previous result."""
+    return adfuller(_spread)[1]
 
 # -----------------------------
-# Resample and Analytics
+# Resample and Analytics (cached)
 # -----------------------------
-df = df.set_index("ts")
-try:
-    resampled = df.groupby("symbol")["price"].resample(timeframe.split()[0]).last().unstack(0)
-except Exception as e:
-    st.error("Error during resampling: " + str(e))
-    st.stop()
+@st.cache_data(ttl=refresh_rate, max_entries=8)
+def compute_analytics(_df: pd.DataFrame, data_key: tuple, s1: str, s2: str, timeframe: str, rolling_window: int,
+                      pivoted: bool = False):
+    """Resample ticks and compute spread, rolling stats, hedge ratio and ADF p-value.
 
-# forward-fill and drop rows that are still empty
-resampled = resampled.fillna(method="ffill").dropna(how="all")
-if s1 not in resampled.columns or s2 not in resampled.columns:
-    st.warning("Selected symbols currently don't have resampled data. Wait for more ticks.")
-    st.stop()
+    The tick DataFrame is not hashed (leading underscore); ``data_key`` identifies
+    its contents instead, so refreshes with no new ticks are served from cache.
+    With ``pivoted`` the frame is already wide and only needs resampling.
+    Returns None when the selected symbols have no resampled data yet.
+    """
+    rule = timeframe.split()[0]
+    if pivoted:
+        resampled = _df.resample(rule).last()
+    else:
+        resampled = _df.set_index("ts").groupby("symbol", observed=True)["price"].resample(rule).last().unstack(0)
 
-resampled = resampled.dropna(subset=[s1, s2])
+    # forward-fill and drop rows that are still empty
+    resampled = resampled.fillna(method="ffill").dropna(how="all")
+    if s1 not in resampled.columns or s2 not in resampled.columns:
+        return None
 
-# Compute spread & rolling stats
-resampled["spread"] = resampled[s1] - resampled[s2]
-resampled["mean"] = resampled["spread"].rolling(rolling_window, min_periods=1).mean()
-resampled["std"] = resampled["spread"].rolling(rolling_window, min_periods=1).std().replace(0, np.nan)
-resampled["zscore"] = (resampled["spread"] - resampled["mean"]) / resampled["std"]
+    resampled = resampled.dropna(subset=[s1, s2])
 
-# -----------------------------
-# Hedge Ratio via OLS (safe)
-# -----------------------------
-hedge_ratio = np.nan
-hedge_points = 0
-try:
-    y = resampled[s1].dropna()
-    X = sm.add_constant(resampled[s2].dropna())
-    joined = pd.concat([y, X], axis=1).dropna()
-    hedge_points = len(joined)
-    if hedge_points >= 5:
-        model = sm.OLS(joined.iloc[:, 0], joined.iloc[:, 1:]).fit()
-        hedge_ratio = model.params[0] if len(model.params) > 0 else np.nan
-except Exception:
+    # Compute spread, rolling stats and rolling correlation in one fused pass
+    spread, mean, std, zscore, corr = compute_stats(
+        resampled[s1].to_numpy(np.float64), resampled[s2].to_numpy(np.float64), int(rolling_window)
+    )
+    resampled["spread"] = spread
+    resampled["mean"] = mean
+    resampled["std"] = std
+    resampled["zscore"] = zscore
+    resampled["rolling_corr"] = corr
+
+    # Hedge Ratio via closed-form simple OLS of s1 on s2 (first coefficient, as
+    # reported by the previous statsmodels fit with a prepended constant)
     hedge_ratio = np.nan
+    xs = resampled[s2].to_numpy(np.float64)
+    ys = resampled[s1].to_numpy(np.float64)
+    mask = ~(np.isnan(xs) | np.isnan(ys))
+    x = xs[mask]
+    y = ys[mask]
+    hedge_points = x.size
+    if hedge_points >= 5:
+        # centred sums avoid cancellation in n*Sxx - Sx**2 at BTC/ETH price levels
+        x_mean, y_mean = x.mean(), y.mean()
+        dx = x - x_mean
+        Sxx = (dx * dx).sum()
+        if Sxx > 0:
+            beta = (dx * (y - y_mean)).sum() / Sxx
+            hedge_ratio = y_mean - beta * x_mean
 
-# -----------------------------
-# ADF Test (safe)
-# -----------------------------
-adf_p = None
-try:
-    spread_clean = resampled["spread"].dropna()
-    if len(spread_clean) >= 10:
-        adf_p = adfuller(spread_clean)[1]
-except Exception:
+    # ADF Test (safe)
     adf_p = None
+    try:
+        spread_clean = resampled["spread"].dropna()
+        if len(spread_clean) >= 10:
+            signature = (s1, s2, rule, spread_clean.index[0], spread_clean.index[-1], len(spread_clean))
+            adf_p = cached_adf(spread_clean.to_numpy(), signature)
+    except Exception:
+        adf_p = None
 
-# -----------------------------
-# Display Charts
-# -----------------------------
-st.subheader("💹 Price Comparison")
-st.plotly_chart(
-    px.line(resampled.reset_index(), x="ts", y=[s1, s2], title="Price Chart"),
-    use_container_width=True,
-)
-
-st.subheader("📊 Spread and Z-Score")
-st.plotly_chart(
-    px.line(resampled.reset_index(), x="ts", y=["spread", "mean"], title="Spread"),
-    use_container_width=True,
-)
-st.plotly_chart(
-    px.line(resampled.reset_index(), x="ts", y="zscore", title="Z-Score"),
-    use_container_width=True,
-)
+    return resampled, hedge_ratio, hedge_points, adf_p
 
 # -----------------------------
-# Rolling Correlation
+# Chart helper
 # -----------------------------
-try:
-    resampled["rolling_corr"] = resampled[s1].rolling(rolling_window, min_periods=2).corr(resampled[s2])
-    st.subheader("📈 Rolling Correlation")
-    st.plotly_chart(
-        px.line(resampled.reset_index(), x="ts", y="rolling_corr", title="Rolling Correlation Between Symbols"),
-        use_container_width=True,
-    )
-except Exception:
-    st.info("Rolling correlation not available yet.")
+def patched_line_chart(key: str, frame: pd.DataFrame, columns: list, title: str):
+    """Build the Plotly figure once per session, then only swap trace data on refresh."""
+    fig = st.session_state.get(key)
+    if fig is None:
+        fig = go.Figure([go.Scatter(name=c, mode="lines") for c in columns])
+        fig.update_layout(title=title, xaxis_title="ts")
+        st.session_state[key] = fig
+    for trace, col in zip(fig.data, columns):
+        trace.x = frame.index
+        trace.y = frame[col].to_numpy()
+    st.plotly_chart(fig, use_container_width=True)
 
 # -----------------------------
-# Metrics Display
+# Live Panel (fragment — only this part reruns on each refresh)
 # -----------------------------
-colA, colB, colC = st.columns(3)
-latest_spread = resampled["spread"].iloc[-1] if not resampled["spread"].empty else np.nan
-colA.metric("Latest Spread", f"{latest_spread:.4f}")
-colB.metric("Hedge Ratio (OLS)", f"{hedge_ratio:.4f}" if not np.isnan(hedge_ratio) else "N/A")
-colC.metric("ADF p-value", f"{adf_p:.4f}" if adf_p is not None else "N/A")
+@st.fragment(run_every=f"{refresh_rate}s" if mode == "🗄️ Live Database" else None)
+def live_panel(timeframe: str, rolling_window: int, z_alert: float):
+    pivoted = False  # True when df is already wide (ts index, one column per symbol)
+    if ndjson_df is not None:
+        df = ndjson_df
+    else:
+        # wide_ticks is the primary live source; raw ticks are only read for
+        # databases without wide_ticks data (written before it existed)
+        df = load_wide_from_db()
+        pivoted = not df.empty
+        if not pivoted:
+            df = load_from_db()
+        if df.empty:
+            st.warning("⚠️ Database empty or no ticks yet. Start collector or switch to NDJSON.")
+            return
+        st.caption(f"✅ Loaded {len(df)} rows")
 
-st.caption(f"📊 Hedge Ratio based on {hedge_points} samples | ADF test on {len(resampled)} samples")
+    # -----------------------------
+    # Symbol Selection
+    # -----------------------------
+    if pivoted:
+        symbols = [c for c in df.columns if df[c].notna().any()]
+    else:
+        symbols = df["symbol"].unique().tolist()
+    if len(symbols) < 2:
+        st.warning("⚠️ Not enough symbols in data. Waiting for more...")
+        return
 
-# -----------------------------
-# Alerts & Signals
-# -----------------------------
-z_latest = resampled["zscore"].dropna().iloc[-1] if not resampled["zscore"].dropna().empty else np.nan
-if not np.isnan(z_latest) and abs(z_latest) > z_alert:
-    if z_latest > 0:
-        st.error(f"⚠️ SELL Signal — z-score: {z_latest:.2f}")
+    col1, col2 = st.columns(2)
+    s1 = col1.selectbox("Symbol 1", symbols, index=0)
+    s2 = col2.selectbox("Symbol 2", symbols, index=1 if len(symbols) > 1 else 0)
+
+    if s1 == s2:
+        st.warning("Please select two different symbols.")
+        return
+
+    last_ts = df.index[-1] if pivoted else df["ts"].iloc[-1]
+    data_key = (mode, selected_file, pivoted, len(df), last_ts)
+    try:
+        analytics = compute_analytics(df, data_key, s1, s2, timeframe, rolling_window, pivoted)
+    except Exception as e:
+        st.error("Error during resampling: " + str(e))
+        return
+
+    if analytics is None:
+        st.warning("Selected symbols currently don't have resampled data. Wait for more ticks.")
+        return
+
+    resampled, hedge_ratio, hedge_points, adf_p = analytics
+
+    # -----------------------------
+    # Display Charts
+    # -----------------------------
+    st.subheader("💹 Price Comparison")
+    st.line_chart(resampled[[s1, s2]])
+
+    st.subheader("📊 Spread and Z-Score")
+    patched_line_chart("spread_fig", resampled, ["spread", "mean"], "Spread")
+    patched_line_chart("zscore_fig", resampled, ["zscore"], "Z-Score")
+
+    # -----------------------------
+    # Rolling Correlation
+    # -----------------------------
+    if resampled["rolling_corr"].notna().any():
+        st.subheader("📈 Rolling Correlation")
+        patched_line_chart("corr_fig", resampled, ["rolling_corr"], "Rolling Correlation Between Symbols")
     else:
-        st.success(f"✅ BUY Signal — z-score: {z_latest:.2f}")
-
-st.subheader("🧭 Mean-Reversion Trading Signal")
-if not np.isnan(z_latest):
-    if z_latest > 2:
-        st.warning("🚨 SELL Signal: Z-Score above +2 (Overbought — potential short entry)")
-    elif z_latest < 0:
-        st.success("✅ BUY Signal: Z-Score below 0 (Mean reversion — potential long entry)")
+        st.info("Rolling correlation not available yet.")
+
+    # -----------------------------
+    # Metrics Display
+    # -----------------------------
+    colA, colB, colC = st.columns(3)
+    latest_spread = resampled["spread"].iloc[-1] if not resampled["spread"].empty else np.nan
+    colA.metric("Latest Spread", f"{latest_spread:.4f}")
+    colB.metric("Hedge Ratio (OLS)", f"{hedge_ratio:.4f}" if not np.isnan(hedge_ratio) else "N/A")
+    colC.metric("ADF p-value", f"{adf_p:.4f}" if adf_p is not None else "N/A")
+
+    st.caption(f"📊 Hedge Ratio based on {hedge_points} samples | ADF test on {len(resampled)} samples")
+
+    # -----------------------------
+    # Alerts & Signals
+    # -----------------------------
+    z_latest = resampled["zscore"].dropna().iloc[-1] if not resampled["zscore"].dropna().empty else np.nan
+    if not np.isnan(z_latest) and abs(z_latest) > z_alert:
+        if z_latest > 0:
+            st.error(f"⚠️ SELL Signal — z-score: {z_latest:.2f}")
+        else:
+            st.success(f"✅ BUY Signal — z-score: {z_latest:.2f}")
+
+    st.subheader("🧭 Mean-Reversion Trading Signal")
+    if not np.isnan(z_latest):
+        if z_latest > 2:
+            st.warning("🚨 SELL Signal: Z-Score above +2 (Overbought — potential short entry)")
+        elif z_latest < 0:
+            st.success("✅ BUY Signal: Z-Score below 0 (Mean reversion — potential long entry)")
+        else:
+            st.info("ℹ️ Neutral Zone: No strong trading signal currently")
     else:
-        st.info("ℹ️ Neutral Zone: No strong trading signal currently")
-else:
-    st.info("ℹ️ Waiting for sufficient data to compute z-score...")
+        st.info("ℹ️ Waiting for sufficient data to compute z-score...")
 
-# -----------------------------
-# Download CSV
-# -----------------------------
-resampled_out = resampled.fillna(0).round(6).reset_index()
-csv = resampled_out.to_csv(index=False)
-st.download_button("📥 Download Processed CSV", csv, "processed_data.csv", "text/csv")
+    # -----------------------------
+    # Download CSV
+    # -----------------------------
+    resampled_out = resampled.fillna(0).round(6).reset_index()
+    csv = resampled_out.to_csv(index=False)
+    st.download_button("📥 Download Processed CSV", csv, "processed_data.csv", "text/csv")
+
+live_panel(timeframe, rolling_window, z_alert)
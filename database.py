@@ -5,7 +5,8 @@ DB_PATH = "tick_data.db"
 
 def get_latest_data(limit=1000):
     conn = sqlite3.connect(DB_PATH)
-    query = "SELECT * FROM ticks ORDER BY timestamp DESC LIMIT ?"
+    # same filter as the dashboard: skip legacy text timestamps not yet migrated by init_db
+    query = "SELECT * FROM ticks WHERE typeof(timestamp) = 'integer' ORDER BY rowid DESC LIMIT ?"
     df = pd.read_sql_query(query, conn, params=(limit,))
     conn.close()
-    return df.sort_values("timestamp")
+    return df.iloc[::-1].reset_index(drop=True)
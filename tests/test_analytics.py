@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import compute_stats
+
+
+def pandas_stats(a, b, w):
+    spread = pd.Series(a - b)
+    mean = spread.rolling(w, min_periods=1).mean()
+    std = spread.rolling(w, min_periods=1).std().replace(0, np.nan)
+    corr = pd.Series(a).rolling(w, min_periods=2).corr(pd.Series(b))
+    return mean.to_numpy(), std.to_numpy(), ((spread - mean) / std).to_numpy(), corr.to_numpy()
+
+
+def test_matches_pandas_on_random_walk():
+    rng = np.random.default_rng(0)
+    a = 100000 + np.cumsum(rng.normal(0, 5, 3000))
+    b = 3800 + np.cumsum(rng.normal(0, 1, 3000))
+    for w in (3, 20, 200):
+        spread, mean, std, zscore, corr = compute_stats(a, b, w)
+        p_mean, p_std, p_z, p_corr = pandas_stats(a, b, w)
+        np.testing.assert_allclose(spread, a - b)
+        np.testing.assert_allclose(mean, p_mean, rtol=1e-12)
+        # pandas' own rolling sums carry ~1e-5 relative error on short windows
+        np.testing.assert_allclose(std, p_std, rtol=1e-4)
+        np.testing.assert_allclose(zscore, p_z, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(corr, p_corr, atol=1e-4)
+
+
+def test_flat_after_volatile_is_nan():
+    # a forward-filled gap after a volatile stretch must not report rounding
+    # residue as variance or correlation, and must not skew later windows
+    w = 20
+    for base in (0.0, 100.0, 3800.0, 1e5):
+        for seed in range(20):
+            rng = np.random.default_rng(seed)
+            a = base + np.cumsum(rng.normal(0, 1, 320))
+            b = base / 2 + np.cumsum(rng.normal(0, 1, 320))
+            a[200:260] = a[199]
+            b[200:260] = b[199]
+            _, mean, std, zscore, corr = compute_stats(a, b, w)
+            flat = slice(200 + w - 1, 260)
+            assert np.isnan(std[flat]).all()
+            assert np.isnan(zscore[flat]).all()
+            assert np.isnan(corr[flat]).all()
+            np.testing.assert_allclose(mean[flat], a[199] - b[199])
+
+            after = slice(260 + w, None)
+            _, p_std, _, p_corr = pandas_stats(a, b, w)
+            np.testing.assert_allclose(std[after], p_std[after], rtol=1e-4)
+            np.testing.assert_allclose(corr[after], p_corr[after], atol=1e-4)
+
+
+def test_corr_within_bounds():
+    rng = np.random.default_rng(2)
+    a = 100 + np.cumsum(rng.normal(0, 1, 1000))
+    b = 2 * a + 7
+    corr = compute_stats(a, b, 20)[4]
+    assert np.nanmax(np.abs(corr)) <= 1.0